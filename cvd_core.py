@@ -0,0 +1,103 @@
+import math
+
+import numpy as np
+import streamlit as st
+
+# Risk model and helpers shared by the app scripts. Living in an imported
+# module, these are defined once per process rather than on every rerun.
+
+# ── Risk Calculation Functions ─────────────────────────────────────────────────
+_LOG_0_9 = math.log(0.9)  # log of the 10-year baseline survival
+
+# Linear-predictor coefficients, one per _features() column
+_COEF = np.array([0.064, 0.34, 0.02, 0.25, -0.25, 0.44, 0.51, -0.2, 0.25, 0.4])
+# The same coefficients as Python floats, for the single-patient scalar path
+_COEF_F = tuple(_COEF.tolist())
+
+def _features(age, sex_male, sbp, tc, hdl, smoker, diabetes, egfr, crp, vasc):
+    # One row per patient (a single row for scalar inputs), columns matching _COEF
+    cols = np.broadcast_arrays(age, sex_male, sbp, tc, hdl, smoker, diabetes,
+                               np.divide(egfr, 10), np.log1p(crp), vasc)
+    return np.stack(cols, axis=-1).astype(np.float64)
+
+def estimate_10y_risk_vec(age, sex_male, sbp, tc, hdl, smoker, diabetes, egfr, crp, vasc):
+    # Array twin of estimate_10y_risk: scores a whole cohort with one matrix-vector product
+    lp = _features(age, sex_male, sbp, tc, hdl, smoker, diabetes, egfr, crp, vasc) @ _COEF
+    raw = 1.0 - np.exp(_LOG_0_9 * np.exp(lp - 5.8))
+    return np.minimum(raw * 100, 95.0)
+
+# Pure functions of scalar inputs: memoised so reruns with unchanged inputs skip the maths
+@st.cache_data(max_entries=1024, show_spinner=False)
+def estimate_10y_risk(age, sex, sbp, tc, hdl, smoker, diabetes, egfr, crp, vasc):
+    # Plain math for one patient: building feature arrays costs far more than the sum
+    b_age, b_sex, b_sbp, b_tc, b_hdl, b_sm, b_dm, b_egfr, b_crp, b_vasc = _COEF_F
+    sex_v = 1 if sex == "Male" else 0
+    sm_v = 1 if smoker else 0
+    dm_v = 1 if diabetes else 0
+    lp = (b_age * age + b_sex * sex_v + b_sbp * sbp + b_tc * tc
+          + b_hdl * hdl + b_sm * sm_v + b_dm * dm_v
+          + b_egfr * (egfr / 10) + b_crp * math.log1p(crp) + b_vasc * vasc)
+    raw = 1.0 - math.exp(_LOG_0_9 * math.exp(lp - 5.8))
+    return min(raw * 100, 95.0)
+
+@st.cache_resource(show_spinner=False)
+def _numba_risk_kernel():
+    # Built lazily so single-patient use never pays numba's import and JIT cost
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+
+    @njit(cache=True, fastmath=True)
+    def kernel(feats, coef, log_s0):
+        out = np.empty(feats.shape[0])
+        for i in range(feats.shape[0]):
+            lp = 0.0
+            for j in range(coef.shape[0]):
+                lp += coef[j] * feats[i, j]
+            out[i] = min((1.0 - math.exp(log_s0 * math.exp(lp - 5.8))) * 100, 95.0)
+        return out
+    return kernel
+
+def estimate_10y_risk_cohort(age, sex_male, sbp, tc, hdl, smoker, diabetes, egfr, crp, vasc):
+    # Batch scoring: numba-compiled loop when available, NumPy otherwise
+    kernel = _numba_risk_kernel()
+    if kernel is None:
+        return estimate_10y_risk_vec(age, sex_male, sbp, tc, hdl, smoker, diabetes, egfr, crp, vasc)
+    feats = _features(age, sex_male, sbp, tc, hdl, smoker, diabetes, egfr, crp, vasc)
+    # The kernel works on flat rows; give back the broadcast input shape like the NumPy path
+    out = kernel(feats.reshape(-1, _COEF.shape[0]), _COEF, _LOG_0_9)
+    return out.reshape(feats.shape[:-1])
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def convert_5yr(r10):
+    p = min(r10, 95.0) / 100
+    return min(-math.expm1(0.5 * math.log1p(-p)) * 100, 95.0)
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def estimate_lifetime_risk(age, r10):
+    years = max(85 - age, 0)
+    p10 = min(r10, 95.0) / 100
+    annual = 1 - (1 - p10) ** (1 / 10)
+    return min((1 - (1 - annual) ** years) * 100, 95.0)
+
+# Formatting helper
+def fmt(x): return f"{x:.1f}%"
+
+# CSV export of the risk estimates
+@st.cache_data(max_entries=128, show_spinner=False)
+def build_csv(r5, r10, lt):
+    rows = ["Metric,Value", f"5yr,{r5:.1f}", f"10yr,{r10:.1f}"]
+    if lt is not None:
+        rows.append(f"Lifetime,{lt:.1f}")
+    return "\n".join(rows) + "\n"
+
+# ── Therapy Efficacy ──────────────────────────────────────────────────────────
+# Fractional LDL-C reduction per therapy
+E = {"Simvastatin 20 mg":0.1,"Simvastatin 40 mg":0.2,
+     "Atorvastatin 10 mg":0.3,"Atorvastatin 80 mg":0.5,
+     "Rosuvastatin 5 mg":0.25,"Rosuvastatin 20 mg":0.55,
+     "Ezetimibe 10 mg":0.2,"Bempedoic acid":0.18,
+     "PCSK9 inhibitor":0.6,"siRNA":0.55}
+# Remaining LDL-C fraction per therapy
+FACTORS = {k: 1.0 - v for k, v in E.items()}